@@ -152,6 +152,26 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 
+# VIRTUAL CATALOG
+# Serve products computed deterministically from (seed, id) instead of reading them
+# from the database. Useful for frontend and load tests with very large catalogs.
+VIRTUAL_CATALOG = os.getenv('VIRTUAL_CATALOG', '0').lower() in ('true', '1', 't')
+VIRTUAL_CATALOG_SIZE = int(os.getenv('VIRTUAL_CATALOG_SIZE', '1000000'))
+VIRTUAL_CATALOG_SEED = int(os.getenv('VIRTUAL_CATALOG_SEED', '0'))
+
+
+# CATALOG STORE
+# Keep compact per-process columns of the catalog to answer category filters, orderings
+# and pagination without database sorting. A background thread in each worker checks the
+# data version every CATALOG_STORE_REFRESH_INTERVAL seconds and re-reads changes made
+# since its last refresh, minus CATALOG_STORE_SAFETY_WINDOW seconds so transactions that
+# commit late (up to that long) are not missed. Run Gunicorn with --preload so workers
+# share the memory of the copy loaded at boot.
+CATALOG_STORE = os.getenv('CATALOG_STORE', '0').lower() in ('true', '1', 't')
+CATALOG_STORE_REFRESH_INTERVAL = float(os.getenv('CATALOG_STORE_REFRESH_INTERVAL', '5'))
+CATALOG_STORE_SAFETY_WINDOW = float(os.getenv('CATALOG_STORE_SAFETY_WINDOW', '60'))
+
+
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fake_commerce_api.settings')
 
 application = get_wsgi_application()
+
+if settings.CATALOG_STORE:
+    from products.catalog_store import preload_catalog_store
+    preload_catalog_store()
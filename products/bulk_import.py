@@ -0,0 +1,282 @@
+import codecs
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+
+from products.models import CatalogVersion, Category, Product
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+
+INPUT_FORMATS = ('csv', 'ndjson')
+
+_MAX_LENGTHS = {
+    'external_id': Product._meta.get_field('external_id').max_length,
+    'title': Product._meta.get_field('title').max_length,
+    'image': Product._meta.get_field('image').max_length,
+    'sizes': Product._meta.get_field('sizes').max_length,
+    'category': Category._meta.get_field('name').max_length,
+}
+_MAX_PRICE = Decimal(10) ** (Product._meta.get_field('price').max_digits - Product._meta.get_field('price').decimal_places)
+_UPDATE_FIELDS = ['title', 'description', 'price', 'image', 'sizes', 'category', 'updated_at']
+
+_validate_url = URLValidator()
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(stream, input_format):
+    """
+    Yields (line_number, raw_row) pairs from a binary CSV or NDJSON stream,
+    one row at a time. Unparseable NDJSON lines are yielded as RowError.
+    The stream only needs to iterate over lines (files, uploads, requests).
+    """
+    text = codecs.iterdecode(iter(stream), 'utf-8-sig')
+    if input_format == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_number, RowError('Invalid JSON.')
+                continue
+            if not isinstance(row, dict):
+                row = RowError('Each line must be a JSON object.')
+            yield line_number, row
+
+
+def _clean_text(raw, field, required=True):
+    value = raw.get(field)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f'"{field}" is required.')
+    if '\x00' in value:
+        raise RowError(f'"{field}" must not contain NUL characters.')
+    max_length = _MAX_LENGTHS.get(field)
+    if max_length and len(value) > max_length:
+        raise RowError(f'"{field}" must have at most {max_length} characters.')
+    return value
+
+
+def clean_row(raw):
+    """
+    Validates one raw row against the Product field constraints and returns
+    a dict ready to upsert. Raises RowError with a readable message.
+    """
+    if isinstance(raw, RowError):
+        raise raw
+
+    sizes = raw.get('sizes')
+    if isinstance(sizes, list):
+        raw = {**raw, 'sizes': ','.join(str(size).strip() for size in sizes)}
+
+    try:
+        price = Decimal(str(raw.get('price', '')).strip())
+    except InvalidOperation:
+        raise RowError('"price" must be a decimal number.')
+    if not price.is_finite() or price < 0 or price >= _MAX_PRICE or price.as_tuple().exponent < -2:
+        raise RowError(f'"price" must be between 0 and {_MAX_PRICE} with at most 2 decimal places.')
+
+    image = _clean_text(raw, 'image', required=False) or None
+    if image is not None:
+        try:
+            _validate_url(image)
+        except ValidationError:
+            raise RowError('"image" must be a valid URL.')
+
+    return {
+        'external_id': _clean_text(raw, 'external_id'),
+        'title': _clean_text(raw, 'title'),
+        'description': _clean_text(raw, 'description'),
+        'price': price,
+        'image': image,
+        'category': _clean_text(raw, 'category'),
+        'sizes': _clean_text(raw, 'sizes'),
+    }
+
+
+class ProductImporter:
+    """
+    Upserts products by `external_id` in batches. On PostgreSQL each batch is
+    COPYed into a temporary staging table and merged with INSERT ... ON CONFLICT;
+    other databases use bulk_create with update_conflicts. Categories are created
+    by name as needed. Each batch commits on its own; a batch the database
+    rejects is reported by its line range and the import carries on. Model
+    signals are bypassed, so the catalog version is bumped once when the import
+    finishes.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, using='default'):
+        self.batch_size = batch_size
+        self.using = using
+        self.connection = connections[using]
+        self.imported = 0
+        self.rejected = 0
+        self.skipped = 0
+        self.completed = False
+        self.errors = []
+
+    def run(self, rows):
+        """
+        Imports (line_number, raw_row) pairs and returns a summary dict. Every
+        input row is counted as imported, rejected, or skipped (superseded by a
+        later row with the same `external_id` in its batch). If the input
+        cannot be read to the end, the rows read so far are still imported,
+        `completed` is False and an error without a line says why it stopped.
+        """
+        batch = {}
+        first_line = last_line = None
+        line_number = 0
+        try:
+            try:
+                for line_number, raw in rows:
+                    try:
+                        row = clean_row(raw)
+                    except RowError as error:
+                        self.rejected += 1
+                        self._report({'line': line_number, 'error': str(error)})
+                        continue
+                    # Later rows win; ON CONFLICT cannot touch the same key twice per statement
+                    if row['external_id'] in batch:
+                        self.skipped += 1
+                    batch[row['external_id']] = row
+                    if first_line is None:
+                        first_line = line_number
+                    last_line = line_number
+                    if len(batch) >= self.batch_size:
+                        self._flush(batch, first_line, last_line)
+                        batch = {}
+                        first_line = None
+                self.completed = True
+            except (UnicodeDecodeError, csv.Error) as error:
+                # Earlier batches are already committed, so report them rather than fail outright
+                self.errors.append({'error': f'Could not read the input after line {line_number}: {error}'})
+            if batch:
+                self._flush(batch, first_line, last_line)
+        finally:
+            self._drop_staging()
+            if self.imported:
+                CatalogVersion.bump()
+
+        return {
+            'imported': self.imported, 'rejected': self.rejected, 'skipped': self.skipped,
+            'completed': self.completed, 'errors': self.errors,
+        }
+
+    def _report(self, error):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(error)
+
+    def _flush(self, batch, first_line, last_line):
+        rows = list(batch.values())
+        try:
+            with transaction.atomic(using=self.using):
+                if self.connection.vendor == 'postgresql':
+                    self._upsert_postgresql(rows)
+                else:
+                    self._upsert_generic(rows)
+        except DatabaseError as error:
+            self.rejected += len(rows)
+            self._report({'lines': [first_line, last_line], 'error': f'The database rejected the batch: {error}'.strip()})
+            return
+        self.imported += len(rows)
+
+    def _upsert_generic(self, rows):
+        names = {row['category'] for row in rows}
+        Category.objects.using(self.using).bulk_create(
+            [Category(name=name) for name in names], ignore_conflicts=True,
+        )
+        category_ids = dict(Category.objects.using(self.using).filter(name__in=names).values_list('name', 'id'))
+        Product.objects.using(self.using).bulk_create(
+            [
+                Product(
+                    external_id=row['external_id'],
+                    title=row['title'],
+                    description=row['description'],
+                    price=row['price'],
+                    image=row['image'],
+                    sizes=row['sizes'],
+                    category_id=category_ids[row['category']],
+                )
+                for row in rows
+            ],
+            update_conflicts=True,
+            unique_fields=['external_id'],
+            update_fields=_UPDATE_FIELDS,
+        )
+
+    def _upsert_postgresql(self, rows):
+        quote = self.connection.ops.quote_name
+        product_table = quote(Product._meta.db_table)
+        category_table = quote(Category._meta.db_table)
+        staging_table = quote('products_product_import')
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            # An unquoted empty CSV field is loaded as NULL
+            writer.writerow([
+                row['external_id'], row['title'], row['description'], row['price'],
+                row['image'] or '', row['category'], row['sizes'],
+            ])
+        buffer.seek(0)
+
+        with self.connection.cursor() as cursor:
+            # A batch that was rolled back also rolls back the table it created
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE IF NOT EXISTS {staging_table} ('
+                'external_id text, title text, description text, price numeric(10, 2), '
+                'image text, category_name text, sizes text)'
+            )
+            cursor.execute(f'TRUNCATE {staging_table}')
+
+            copy_sql = (
+                f'COPY {staging_table} (external_id, title, description, price, image, category_name, sizes) '
+                'FROM STDIN WITH (FORMAT csv)'
+            )
+            if hasattr(cursor.cursor, 'copy_expert'):
+                cursor.cursor.copy_expert(copy_sql, buffer)
+            else:
+                with cursor.cursor.copy(copy_sql) as copy:
+                    copy.write(buffer.getvalue())
+
+            cursor.execute(
+                f'INSERT INTO {category_table} (name) '
+                f'SELECT DISTINCT category_name FROM {staging_table} '
+                'ON CONFLICT (name) DO NOTHING'
+            )
+            cursor.execute(
+                f'INSERT INTO {product_table} '
+                '(external_id, title, description, price, image, sizes, category_id, updated_at) '
+                'SELECT s.external_id, s.title, s.description, s.price, s.image, s.sizes, c.id, %s '
+                f'FROM {staging_table} s JOIN {category_table} c ON c.name = s.category_name '
+                'ON CONFLICT (external_id) DO UPDATE SET '
+                'title = EXCLUDED.title, description = EXCLUDED.description, price = EXCLUDED.price, '
+                'image = EXCLUDED.image, sizes = EXCLUDED.sizes, category_id = EXCLUDED.category_id, '
+                'updated_at = EXCLUDED.updated_at',
+                # Same (application) clock as auto_now, which the catalog store's watermark relies on
+                [timezone.now()],
+            )
+
+    def _drop_staging(self):
+        if self.connection.vendor == 'postgresql':
+            with self.connection.cursor() as cursor:
+                cursor.execute('DROP TABLE IF EXISTS pg_temp.products_product_import')
+
+
+def import_products(stream, input_format, batch_size=DEFAULT_BATCH_SIZE):
+    """Imports products from a binary CSV or NDJSON stream and returns a summary dict."""
+    return ProductImporter(batch_size=batch_size).run(read_rows(stream, input_format))
@@ -0,0 +1,500 @@
+import bisect
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+from array import array
+from datetime import timedelta
+from fractions import Fraction
+from functools import partial
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from products.models import CatalogVersion, Category, Product, ProductTombstone
+from products.product_lists import INVALID_CATEGORY_MESSAGE, LazyProductList
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 10000
+_EMPTY_INDEX = array('q')
+_ORDERINGS = ('id', 'price', 'title')
+
+# An overlay larger than this (relative to the snapshot) is folded into a new snapshot
+_MAX_OVERLAY_FRACTION = 0.05
+_MIN_OVERLAY_ROWS = 1000
+
+_TOMBSTONE_RETENTION = timedelta(days=1)
+
+
+def _to_cents(price):
+    return int(price * 100)
+
+
+class CatalogSnapshot:
+    """
+    Array-backed columns and presorted id indexes, built from a full read.
+
+    Columns are aligned by position and sorted by id. `indexes` maps
+    (ordering, category_id) to the ids in that order, where category_id is
+    None for the whole catalog; descending orders read these backwards.
+    A snapshot is never modified once built, so when it is loaded before
+    forking, its pages stay shared between workers.
+    """
+
+    def __init__(self, ids, price_cents, category_ids, title_ranks):
+        self.ids = ids
+        self.price_cents = price_cents
+        self.category_ids = category_ids
+        self.title_ranks = title_ranks
+        self.indexes = {}
+
+        size = len(ids)
+        permutations = {
+            'id': range(size),
+            'price': sorted(range(size), key=price_cents.__getitem__),
+            'title': sorted(range(size), key=title_ranks.__getitem__),
+        }
+        for ordering, permutation in permutations.items():
+            self.indexes[(ordering, None)] = array('q', (ids[position] for position in permutation))
+            for position in permutation:
+                key = (ordering, category_ids[position])
+                if key not in self.indexes:
+                    self.indexes[key] = array('q')
+                self.indexes[key].append(ids[position])
+
+    def position(self, product_id):
+        position = bisect.bisect_left(self.ids, product_id)
+        if position < len(self.ids) and self.ids[position] == product_id:
+            return position
+        return None
+
+    def sort_key(self, ordering, product_id):
+        """Key of a snapshot row in `ordering`, comparable with CatalogOverlay.sort_key."""
+        if ordering == 'id':
+            return (product_id,)
+        position = self.position(product_id)
+        if ordering == 'price':
+            return (self.price_cents[position], product_id)
+        return (self.title_ranks[position], 0)
+
+    def memory_footprint(self):
+        """Bytes held by the columns and indexes."""
+        arrays = [self.ids, self.price_cents, self.category_ids, self.title_ranks, *self.indexes.values()]
+        return sum(len(column) * column.itemsize for column in arrays)
+
+
+def build_snapshot(recent_since):
+    """
+    Reads every product once, in database title order, and returns a snapshot
+    with the `updated_at` of the rows updated since `recent_since`, by id.
+    """
+    title_ids = array('q')
+    title_prices = array('q')
+    title_categories = array('q')
+    recent = {}
+    rows = Product.objects.order_by('title', 'id').values_list('id', 'price', 'category_id', 'updated_at')
+    for product_id, price, category_id, updated_at in rows.iterator(chunk_size=_CHUNK_SIZE):
+        title_ids.append(product_id)
+        title_prices.append(_to_cents(price))
+        title_categories.append(category_id)
+        if updated_at >= recent_since:
+            recent[product_id] = updated_at
+
+    # A row's title rank is its position in the title order read above
+    by_id = sorted(range(len(title_ids)), key=title_ids.__getitem__)
+    snapshot = CatalogSnapshot(
+        array('q', (title_ids[rank] for rank in by_id)),
+        array('q', (title_prices[rank] for rank in by_id)),
+        array('q', (title_categories[rank] for rank in by_id)),
+        array('L', by_id),
+    )
+    return snapshot, recent
+
+
+class CatalogOverlay:
+    """
+    Products changed since the snapshot was built, kept apart from it.
+
+    `rows` maps a product id to (price_cents, category_id, title_rank, title_key),
+    where title_rank is the rank of the snapshot row that precedes it in
+    database title order (-1 if none), and title_key orders the overlay rows
+    that follow the same snapshot row as the database does, without comparing
+    titles in Python (whose order can differ from the database collation).
+    `hidden` holds the snapshot ids that
+    were changed or deleted. Merged positions for each (ordering, category)
+    are built by `prepare` before the overlay is served, reusing the work
+    done for the overlay it replaces; any other key is built on first use.
+    """
+
+    def __init__(self, rows=None, hidden=frozenset()):
+        self.rows = rows or {}
+        self.hidden = hidden
+        self._layouts = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.rows) + len(self.hidden)
+
+    def sort_key(self, ordering, product_id):
+        price_cents, _, title_rank, title_key = self.rows[product_id]
+        if ordering == 'id':
+            return (product_id,)
+        if ordering == 'price':
+            return (price_cents, product_id)
+        # Sorts right after the snapshot row it follows, then in database order among overlay rows
+        return (title_rank, 1, title_key)
+
+    def prepare(self, snapshot, category_ids, previous=None):
+        """Builds the layouts of every ordering, for the whole catalog and each category."""
+        for ordering in _ORDERINGS:
+            for category_id in (None, *category_ids):
+                self.layout(snapshot, ordering, category_id, previous)
+
+    def layout(self, snapshot, ordering, category_id, previous=None):
+        """
+        Returns (index, hidden_positions, overlay_positions, overlay_ids): the
+        snapshot index, the sorted positions hidden in it, and the merged
+        positions taken by overlay rows, in order.
+        """
+        key = (ordering, category_id)
+        layout = self._layouts.get(key)
+        if layout is None:
+            # Only one thread builds a given layout; the others wait for it
+            with self._lock:
+                layout = self._layouts.get(key)
+                if layout is None:
+                    layout = self._layouts[key] = self._build_layout(snapshot, ordering, category_id, previous)
+        return layout[:4]
+
+    def _build_layout(self, snapshot, ordering, category_id, previous):
+        index = snapshot.indexes.get((ordering, category_id), _EMPTY_INDEX)
+        snapshot_key = partial(snapshot.sort_key, ordering)
+        reused = previous._layouts.get((ordering, category_id)) if previous is not None else None
+        if reused is None:
+            hidden_positions, entries = [], []
+            new_hidden, new_rows = self.hidden, self.rows.items()
+        else:
+            # Positions in the snapshot index do not depend on other rows, so
+            # only rows added or changed since `previous` need a lookup
+            hidden_positions = list(reused[1])
+            entries = [entry for entry in reused[4] if self.rows.get(entry[1]) is previous.rows[entry[1]]]
+            new_hidden = self.hidden - previous.hidden
+            new_rows = [(product_id, row) for product_id, row in self.rows.items() if previous.rows.get(product_id) is not row]
+
+        hidden_positions.extend(
+            bisect.bisect_left(index, snapshot_key(product_id), key=snapshot_key)
+            for product_id in new_hidden
+            if category_id is None or snapshot.category_ids[snapshot.position(product_id)] == category_id
+        )
+        hidden_positions.sort()
+        for product_id, row in new_rows:
+            if category_id is None or row[1] == category_id:
+                entry_key = self.sort_key(ordering, product_id)
+                entries.append((entry_key, product_id, bisect.bisect_left(index, entry_key, key=snapshot_key)))
+        entries.sort()
+
+        overlay_positions = [
+            count + inserted - bisect.bisect_left(hidden_positions, inserted)
+            for count, (_, _, inserted) in enumerate(entries)
+        ]
+        return (index, hidden_positions, overlay_positions, [entry[1] for entry in entries], entries)
+
+
+class CatalogState:
+    """
+    What a worker serves from: a snapshot, its overlay, and the data version
+    they reflect. `recent` maps the ids of rows updated within the safety
+    window before `watermark` to the `updated_at` already reflected.
+    """
+
+    def __init__(self, snapshot, overlay, version, generation, watermark, recent, valid_category_ids):
+        self.snapshot = snapshot
+        self.overlay = overlay
+        self.version = version
+        self.generation = generation
+        self.watermark = watermark
+        self.recent = recent
+        self.valid_category_ids = valid_category_ids
+
+    def memory_footprint(self):
+        overlay = self.overlay
+        return (
+            self.snapshot.memory_footprint()
+            + sys.getsizeof(overlay.rows) + sys.getsizeof(overlay.hidden) + sys.getsizeof(self.recent)
+        )
+
+
+def _title_predecessor(snapshot, rows, product_id, title):
+    """
+    Walks back through the (title, id) index from a changed row until it
+    reaches a row the store already places, and returns that row's
+    (title_rank, title_key); title_key is None for a snapshot row.
+    """
+    while True:
+        previous = (
+            Product.objects.filter(title=title, id__lt=product_id).order_by('-id').values_list('id', 'title').first()
+            or Product.objects.filter(title__lt=title).order_by('-title', '-id').values_list('id', 'title').first()
+        )
+        if previous is None:
+            return -1, None
+        product_id, title = previous
+        if product_id in rows:
+            return rows[product_id][2:]
+        position = snapshot.position(product_id)
+        if position is not None:
+            return snapshot.title_ranks[position], None
+
+
+def _title_key_after(chain, title_key):
+    """
+    A key between `title_key` (None for the snapshot row that starts the
+    chain) and the next key in the sorted `chain`. Fractions never run out
+    of room between two keys.
+    """
+    following = bisect.bisect_right(chain, title_key) if title_key is not None else 0
+    if following == len(chain):
+        return Fraction(0) if title_key is None else title_key + 1
+    if title_key is None:
+        return chain[following] - 1
+    return (title_key + chain[following]) / 2
+
+
+class CatalogStore:
+    """
+    Per-process copy of the catalog columns used to answer category filters,
+    orderings and pagination without asking the database to filter and sort.
+
+    Requests always read the current state without waiting. A background
+    thread checks the data version every CATALOG_STORE_REFRESH_INTERVAL
+    seconds and, when it has changed, reads the products updated and the
+    tombstones written since the last refresh (minus CATALOG_STORE_SAFETY_WINDOW
+    seconds, for transactions that committed late). It merges them into the
+    overlay, builds the merged layouts, and only then swaps the new state in.
+    Only an overlay that has grown too large, or a catalog replaced as a
+    whole (see CatalogVersion.generation), triggers a full rebuild.
+    """
+
+    def __init__(self):
+        self._state = None
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._refresher_pid = None
+
+    def get_state(self):
+        state = self._state
+        if state is None:
+            # Nothing to serve yet (no preload), so this one load has to block
+            self.refresh()
+            state = self._state
+        self._ensure_refresher()
+        return state
+
+    def _ensure_refresher(self):
+        # Threads do not survive fork, so each worker starts its own
+        pid = os.getpid()
+        if self._refresher_pid != pid:
+            with self._start_lock:
+                if self._refresher_pid != pid:
+                    threading.Thread(target=self._run_refresher, name='catalog-store-refresh', daemon=True).start()
+                    self._refresher_pid = pid
+
+    def _run_refresher(self):
+        while True:
+            time.sleep(settings.CATALOG_STORE_REFRESH_INTERVAL)
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Catalog store refresh failed')
+            finally:
+                connections.close_all()
+
+    def refresh(self):
+        """Brings the state up to the current data version. Returns True if it changed."""
+        with self._refresh_lock:
+            state = self._state
+            # Read the version first so writes made during the refresh trigger another one
+            version, generation = CatalogVersion.get_current_with_generation()
+            if state is not None and state.version == version:
+                return False
+
+            started_at = timezone.now()
+            new_state = None
+            if state is not None and state.generation == generation:
+                new_state = self._apply_changes(state, version, started_at)
+            if new_state is None:
+                snapshot, recent = build_snapshot(started_at - self._safety_window())
+                new_state = CatalogState(
+                    snapshot, CatalogOverlay(), version, generation, started_at, recent, self._read_category_ids(),
+                )
+                ProductTombstone.objects.filter(deleted_at__lt=started_at - _TOMBSTONE_RETENTION).delete()
+
+            # Built here so requests never wait on merging the overlay
+            previous = state.overlay if state is not None and state.snapshot is new_state.snapshot else None
+            new_state.overlay.prepare(new_state.snapshot, new_state.valid_category_ids, previous)
+            self._state = new_state
+
+            logger.info(
+                'Catalog store at version %s: %d products, %d overlay rows, %d bytes',
+                version, len(new_state.snapshot.ids), len(new_state.overlay), new_state.memory_footprint(),
+            )
+            return True
+
+    @staticmethod
+    def _safety_window():
+        return timedelta(seconds=settings.CATALOG_STORE_SAFETY_WINDOW)
+
+    @staticmethod
+    def _read_category_ids():
+        return frozenset(Category.objects.values_list('id', flat=True))
+
+    def _apply_changes(self, state, version, started_at):
+        """Merges recent changes into a new overlay, or returns None if a rebuild is due."""
+        snapshot = state.snapshot
+        limit = max(_MIN_OVERLAY_ROWS, int(len(snapshot.ids) * _MAX_OVERLAY_FRACTION))
+        since = state.watermark - self._safety_window()
+
+        rows = dict(state.overlay.rows)
+        hidden = set(state.overlay.hidden)
+
+        # Id-only read of the window; only rows whose stamp is new are read in full
+        recent = dict(Product.objects.filter(updated_at__gte=since).values_list('id', 'updated_at'))
+        changed_ids = [
+            product_id for product_id, updated_at in recent.items() if state.recent.get(product_id) != updated_at
+        ]
+        if len(rows) + len(hidden) + len(changed_ids) > limit:
+            return None
+
+        # Sorted title keys of the overlay rows that follow each snapshot row
+        chains = {}
+        for _, _, title_rank, title_key in rows.values():
+            chains.setdefault(title_rank, []).append(title_key)
+        for chain in chains.values():
+            chain.sort()
+
+        # Title order, so each row's title predecessor is placed before the row itself
+        changed = (
+            Product.objects.filter(id__in=changed_ids).order_by('title', 'id')
+            .values_list('id', 'price', 'category_id', 'title')
+        )
+        for product_id, price, category_id, title in changed.iterator(chunk_size=_CHUNK_SIZE):
+            current = rows.pop(product_id, None)
+            if current is not None:
+                chain = chains[current[2]]
+                del chain[bisect.bisect_left(chain, current[3])]
+            title_rank, previous_key = _title_predecessor(snapshot, rows, product_id, title)
+            chain = chains.setdefault(title_rank, [])
+            title_key = _title_key_after(chain, previous_key)
+            bisect.insort(chain, title_key)
+            rows[product_id] = (_to_cents(price), category_id, title_rank, title_key)
+            if snapshot.position(product_id) is not None:
+                hidden.add(product_id)
+
+        deleted = ProductTombstone.objects.filter(deleted_at__gte=since).values_list('product_id', flat=True)
+        for product_id in set(deleted) - recent.keys():
+            rows.pop(product_id, None)
+            if snapshot.position(product_id) is not None:
+                hidden.add(product_id)
+
+        if len(rows) + len(hidden) > limit:
+            return None
+        return CatalogState(
+            snapshot, CatalogOverlay(rows, frozenset(hidden)), version, state.generation, started_at, recent,
+            self._read_category_ids(),
+        )
+
+    def clear(self):
+        with self._refresh_lock:
+            self._state = None
+
+    def memory_footprint(self):
+        state = self._state
+        return state.memory_footprint() if state is not None else 0
+
+    def products(self, queryset, query_params, ordering_fields):
+        """
+        Returns a StoreProductList for the `category` and `ordering` query
+        parameters, or None if the request needs the database (search or
+        multi-field ordering).
+        """
+        if query_params.get('search'):
+            return None
+        terms = [
+            term.strip() for term in query_params.get('ordering', '').split(',')
+            if term.strip().lstrip('-') in ordering_fields
+        ]
+        if len(terms) > 1:
+            return None
+
+        state = self.get_state()
+        category_id = None
+        category = query_params.get('category')
+        if category:
+            try:
+                category_id = int(category)
+            except ValueError:
+                category_id = None
+            if category_id not in state.valid_category_ids:
+                raise ValidationError({'category': [INVALID_CATEGORY_MESSAGE]})
+
+        ordering = terms[0] if terms else 'id'
+        layout = state.overlay.layout(state.snapshot, ordering.lstrip('-'), category_id)
+        return StoreProductList(queryset, layout, descending=ordering.startswith('-'))
+
+
+class StoreProductList(LazyProductList):
+    """
+    A snapshot index merged with its overlay. Only the rows of the requested
+    slice are read, by primary key.
+    """
+
+    def __init__(self, queryset, layout, descending=False):
+        self.queryset = queryset
+        self.index, self.hidden_positions, self.overlay_positions, self.overlay_ids = layout
+        self.descending = descending
+
+    def __len__(self):
+        return len(self.index) - len(self.hidden_positions) + len(self.overlay_ids)
+
+    def _id_at(self, position):
+        if self.descending:
+            position = len(self) - 1 - position
+        count = bisect.bisect_left(self.overlay_positions, position)
+        if count < len(self.overlay_positions) and self.overlay_positions[count] == position:
+            return self.overlay_ids[count]
+        # The n-th visible snapshot row sits after every hidden position up to it
+        visible = position - count
+        index_position = visible
+        while True:
+            shifted = visible + bisect.bisect_right(self.hidden_positions, index_position)
+            if shifted == index_position:
+                return self.index[index_position]
+            index_position = shifted
+
+    def _fetch(self, ids):
+        products = self.queryset.in_bulk(ids)
+        return [products[product_id] for product_id in ids if product_id in products]
+
+
+_store = CatalogStore()
+
+
+def get_catalog_store():
+    return _store
+
+
+def preload_catalog_store():
+    """
+    Loads the store at worker boot. Under `gunicorn --preload` this runs in the
+    master, so the snapshot's array pages are shared copy-on-write by every
+    worker; workers only add their own small overlays on top.
+    """
+    _store.refresh()
+    # Workers must not inherit the master's database connection
+    connections.close_all()
+    # Keep the collector from touching (and so copying) the preloaded objects
+    gc.freeze()
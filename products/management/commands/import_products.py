@@ -0,0 +1,66 @@
+# products/management/commands/import_products.py
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.bulk_import import DEFAULT_BATCH_SIZE, INPUT_FORMATS, import_products
+
+class Command(BaseCommand):
+    help = 'Upserts products by external_id from a CSV or NDJSON file, without deleting existing data.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Path to the CSV or NDJSON file, or "-" to read from standard input.'
+        )
+        parser.add_argument(
+            '--format',
+            choices=INPUT_FORMATS,
+            help='Input format. Defaults to the file extension.'
+        )
+        parser.add_argument(
+            '--batch_size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='The number of rows to upsert per batch.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format']
+        if not input_format:
+            extension = path.rsplit('.', 1)[-1].lower()
+            input_format = {'jsonl': 'ndjson'}.get(extension, extension)
+            if input_format not in INPUT_FORMATS:
+                raise CommandError('Cannot guess the input format; use --format csv or --format ndjson.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch_size must be a positive integer.')
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Importing products from {path}...'))
+        try:
+            if path == '-':
+                summary = import_products(sys.stdin.buffer, input_format, batch_size=options['batch_size'])
+            else:
+                with open(path, 'rb') as stream:
+                    summary = import_products(stream, input_format, batch_size=options['batch_size'])
+        except OSError as error:
+            raise CommandError(str(error))
+
+        stopped_by = None
+        for error in summary['errors']:
+            if 'line' in error:
+                self.stdout.write(self.style.WARNING(f"Line {error['line']}: {error['error']}"))
+            elif 'lines' in error:
+                self.stdout.write(self.style.WARNING('Lines {}-{}: {}'.format(*error['lines'], error['error'])))
+            else:
+                stopped_by = error['error']
+        message = (
+            f"Imported {summary['imported']} products, rejected {summary['rejected']} rows, "
+            f"skipped {summary['skipped']} rows superseded by a later row with the same external_id."
+        )
+        if not summary['completed']:
+            # Reported after the counts, so it is clear what was written before the failure
+            self.stdout.write(message)
+            raise CommandError(stopped_by)
+        self.stdout.write(self.style.SUCCESS(message))
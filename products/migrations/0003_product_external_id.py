@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_catalogversion_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='external_id',
+            field=models.CharField(blank=True, help_text='Stable supplier key used by bulk imports', max_length=100, null=True, unique=True),
+        ),
+    ]
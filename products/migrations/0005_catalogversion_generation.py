@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_catalog_store_changes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogversion',
+            name='generation',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F
 
 # Create your models here.
 class Category(models.Model):
@@ -12,14 +13,53 @@ class Category(models.Model):
         return self.name
 
 class Product(models.Model):
+    external_id = models.CharField(max_length=100, unique=True, null=True, blank=True, help_text="Stable supplier key used by bulk imports")
     title = models.CharField(max_length=255)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.URLField(max_length=500, blank=True, null=True) 
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     sizes = models.CharField(max_length=255, help_text="Comma separated sizes, e.g., S,M,L,XL")
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
 
+    class Meta:
+        indexes = [models.Index(fields=['title', 'id'], name='product_title_id_idx')]
+
     def __str__(self):
         return self.title
 
+
+class CatalogVersion(models.Model):
+    """
+    Single-row counter bumped whenever catalog data changes, so in-process
+    copies of the catalog know when to refresh. `generation` is also bumped
+    when the whole catalog is replaced, so copies rebuild instead of merging.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    generation = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def get_current(cls):
+        return cls.get_current_with_generation()[0]
+
+    @classmethod
+    def get_current_with_generation(cls):
+        return cls.objects.filter(pk=1).values_list('version', 'generation').first() or (0, 0)
+
+    @classmethod
+    def bump(cls, replaced=False):
+        changes = {'version': F('version') + 1}
+        if replaced:
+            changes['generation'] = F('generation') + 1
+        if not cls.objects.filter(pk=1).update(**changes):
+            cls.objects.get_or_create(pk=1, defaults={'version': 1, 'generation': int(replaced)})
+
+
+class ProductTombstone(models.Model):
+    """
+    Records deleted product ids so in-process catalog copies can drop them
+    without rescanning the product table.
+    """
+    product_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
@@ -0,0 +1,44 @@
+import random
+
+from products.models import Product
+
+INVALID_CATEGORY_MESSAGE = 'Select a valid choice. That choice is not one of the available choices.'
+
+
+class LazyProductList:
+    """
+    Base for lazy, sliceable product sequences that Django's paginator can use
+    in place of a queryset. Subclasses map a position to a product id
+    (`_id_at`) and a list of ids to products (`_fetch`), so only the products
+    of the requested slice are ever built or read.
+    """
+
+    model = Product
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def _id_at(self, position):
+        raise NotImplementedError
+
+    def _fetch(self, ids):
+        """Returns the products for `ids` in the same order, leaving out any that no longer exist."""
+        raise NotImplementedError
+
+    def __getitem__(self, key):
+        length = len(self)
+        if isinstance(key, slice):
+            return self._fetch([self._id_at(position) for position in range(*key.indices(length))])
+        if key < 0:
+            key += length
+        if not 0 <= key < length:
+            raise IndexError('Product list index out of range.')
+        products = self._fetch([self._id_at(key)])
+        if not products:
+            raise IndexError('Product no longer exists.')
+        return products[0]
+
+    def sample(self, count, seed=None):
+        """Returns up to `count` distinct random products from this list."""
+        positions = random.Random(seed).sample(range(len(self)), min(count, len(self)))
+        return self._fetch([self._id_at(position) for position in positions])
@@ -0,0 +1,65 @@
+import random
+
+from django.db.models import Max, Min
+
+# Upper bounds on how hard probing tries before falling back to range scans
+MAX_OVERSAMPLE = 50
+MAX_PROBES_PER_ROUND = 5000
+
+
+def sample_random_products(queryset, count, seed=None, max_rounds=4):
+    """
+    Returns up to `count` random objects from `queryset` without sorting the table.
+
+    Random ids are drawn over the table's primary key range and fetched in
+    batches through the primary key index. Each round oversamples by the hit
+    rate seen so far, so filters such as a category, which only match a
+    fraction of the ids, still fill in a few round-trips. Whatever is still
+    missing is filled by single-row index scans from independent random
+    pivots, so no part of the sample is a contiguous run of ids.
+
+    The id bounds come from the unfiltered table (two index endpoint lookups),
+    not from `queryset`, so the cost does not depend on the filter.
+    The same `seed` over the same data always yields the same products.
+    """
+    queryset = queryset.order_by()
+    bounds = queryset.model._default_manager.aggregate(low=Min('pk'), high=Max('pk'))
+    low, high = bounds['low'], bounds['high']
+    if low is None or count <= 0:
+        return []
+
+    rng = random.Random(seed)
+    picked = {}
+    probes = hits = 0
+
+    for _ in range(max_rounds):
+        missing = count - len(picked)
+        if missing <= 0:
+            break
+        oversample = min(probes / hits, MAX_OVERSAMPLE) if hits else (2 if not probes else MAX_OVERSAMPLE)
+        wanted = min(int(missing * oversample * 1.5) + 1, MAX_PROBES_PER_ROUND)
+
+        candidates = []
+        seen = set(picked)
+        for _ in range(wanted):
+            candidate = rng.randint(low, high)
+            if candidate not in seen:
+                seen.add(candidate)
+                candidates.append(candidate)
+        found = queryset.in_bulk(candidates)
+        probes += len(candidates)
+        hits += len(found)
+        for candidate in candidates:
+            if candidate in found and len(picked) < count:
+                picked[candidate] = found[candidate]
+
+    remaining = queryset.order_by('pk')
+    while len(picked) < count:
+        pivot = rng.randint(low, high)
+        unpicked = remaining.exclude(pk__in=list(picked))
+        product = unpicked.filter(pk__gte=pivot).first() or unpicked.filter(pk__lt=pivot).last()
+        if product is None:
+            break
+        picked[product.pk] = product
+
+    return list(picked.values())
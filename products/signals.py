@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from products.models import CatalogVersion, Category, Product, ProductTombstone
+
+# Connected whatever CATALOG_STORE says: any process that writes (admin, shell,
+# management commands) must tell the web workers that do run the store.
+
+
+def _bump_catalog_version():
+    CatalogVersion.bump()
+
+
+def schedule_catalog_version_bump(using):
+    """
+    Bumps the catalog version once, when the current transaction commits,
+    however many rows the transaction writes.
+    """
+    connection = transaction.get_connection(using)
+    if connection.in_atomic_block and any(
+        callback[1] is _bump_catalog_version for callback in connection.run_on_commit
+    ):
+        return
+    transaction.on_commit(_bump_catalog_version, using=using)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def catalog_changed(sender, using, **kwargs):
+    """Marks in-process catalog copies as stale after any product or category change."""
+    schedule_catalog_version_bump(using)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, using, **kwargs):
+    # Written in the deleting transaction so the tombstone commits with it
+    ProductTombstone.objects.using(using).create(product_id=instance.pk)
+    schedule_catalog_version_bump(using)
+
+
+@contextmanager
+def catalog_replaced():
+    """
+    For writes that replace the whole catalog. Product deletes inside the
+    block skip the per-row tombstones, which lets Django delete them in bulk,
+    and in-process copies are told to rebuild rather than merge changes.
+    """
+    connected = post_delete.disconnect(product_deleted, sender=Product)
+    try:
+        yield
+    finally:
+        if connected:
+            post_delete.connect(product_deleted, sender=Product)
+    CatalogVersion.bump(replaced=True)
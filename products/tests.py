@@ -1,11 +1,23 @@
 
-from django.test import TestCase
-from rest_framework.test import APITestCase
+import io
+import tempfile
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework import status 
 from decimal import Decimal 
 from django.urls import reverse 
 
-from products.models import Category, Product
+from products.models import CatalogVersion, Category, Product, ProductTombstone
+from products.catalog_data import CATEGORIES_DATA, PRICE_MIN, PRICE_MAX
+from products.bulk_import import ProductImporter, read_rows
+from products.catalog_store import get_catalog_store
+from products.sampling import sample_random_products
 
 class ProductAPITestCase(APITestCase):
     """
@@ -203,3 +215,528 @@ class ProductAPITestCase(APITestCase):
         for item in data:
             if item['name'] == 'Category 1':
                 self.assertEqual(item['description'], 'Description 1')
+
+
+    # --- API Tests (Random Products) ---
+
+    def test_product_random_returns_requested_count(self):
+        """Test that the random endpoint returns the requested number of distinct products."""
+        response = self.client.get(self.product_list_url + 'random/?count=3')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [p['id'] for p in response.data]
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(len(set(ids)), 3)
+
+    def test_product_random_count_larger_than_catalog(self):
+        """Test that asking for more products than exist returns the whole catalog."""
+        response = self.client.get(self.product_list_url + 'random/?count=50')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 4)
+
+    def test_product_random_filter_by_category(self):
+        """Test that the random endpoint honours the category filter."""
+        response = self.client.get(f'{self.product_list_url}random/?category={self.category2.id}&count=5')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+        for product_data in response.data:
+            self.assertEqual(product_data['category']['id'], self.category2.id)
+
+    def test_product_random_seed_is_repeatable(self):
+        """Test that the same seed returns the same products in the same order."""
+        first = self.client.get(self.product_list_url + 'random/?count=2&seed=42')
+        second = self.client.get(self.product_list_url + 'random/?count=2&seed=42')
+        self.assertEqual([p['id'] for p in first.data], [p['id'] for p in second.data])
+
+    def test_product_random_invalid_params(self):
+        """Test that non-integer or non-positive parameters are rejected."""
+        response = self.client.get(self.product_list_url + 'random/?count=abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.product_list_url + 'random/?count=0')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.product_list_url + 'random/?seed=x')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RandomSamplingTestCase(TestCase):
+    """
+    Test suite for sampling random products from a sparse filter.
+    """
+
+    def test_sparse_category_sample_is_not_contiguous(self):
+        """Test that a sample from one of many interleaved categories is spread out."""
+        categories = [Category.objects.create(name=f'Category {i}') for i in range(10)]
+        Product.objects.bulk_create([
+            Product(category=categories[i % 10], title=f'P{i}', description='D', price=Decimal('1.00'), sizes='S')
+            for i in range(5000)
+        ])
+        category_ids = list(
+            Product.objects.filter(category=categories[3]).order_by('id').values_list('id', flat=True)
+        )
+        rank = {product_id: position for position, product_id in enumerate(category_ids)}
+
+        for seed in (1, 2, 3):
+            products = sample_random_products(Product.objects.filter(category=categories[3]), 50, seed=seed)
+            self.assertEqual(len({p.id for p in products}), 50)
+            self.assertTrue(all(p.category_id == categories[3].id for p in products))
+
+            ranks = sorted(rank[p.id] for p in products)
+            longest = run = 1
+            for previous, current in zip(ranks, ranks[1:]):
+                run = run + 1 if current == previous + 1 else 1
+                longest = max(longest, run)
+            self.assertLess(longest, 8)
+
+
+@override_settings(VIRTUAL_CATALOG=True, VIRTUAL_CATALOG_SIZE=50, VIRTUAL_CATALOG_SEED=7)
+class VirtualCatalogAPITestCase(APITestCase):
+    """
+    Test suite for the database-free virtual catalog mode.
+    """
+
+    def setUp(self):
+        self.product_list_url = '/api/products/'
+        self.category_list_url = '/api/categories/'
+
+    def test_virtual_catalog_uses_no_database(self):
+        """Test that list, detail and category endpoints never query the database."""
+        with self.assertNumQueries(0):
+            self.client.get(self.product_list_url + '?ordering=-price&category=2')
+            self.client.get(f'{self.product_list_url}17/')
+            self.client.get(self.category_list_url)
+
+    def test_virtual_product_list_pagination(self):
+        """Test that the virtual catalog is paginated over its configured size."""
+        response = self.client.get(self.product_list_url + '?page=2&page_size=20')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 50)
+        self.assertEqual([p['id'] for p in response.data['results']], list(range(21, 41)))
+
+    def test_virtual_product_is_deterministic(self):
+        """Test that a product is generated identically from its id on every request."""
+        first = self.client.get(f'{self.product_list_url}17/')
+        second = self.client.get(f'{self.product_list_url}17/')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data, second.data)
+
+        data = first.data
+        self.assertEqual(data['id'], 17)
+        self.assertTrue(PRICE_MIN <= Decimal(data['price']) <= PRICE_MAX)
+        self.assertIn(data['category']['name'], [c['name'] for c in CATEGORIES_DATA])
+        self.assertTrue(data['image'].startswith('https://res.cloudinary.com/'))
+
+    def test_virtual_product_detail_not_found(self):
+        """Test that ids outside the virtual catalog return 404."""
+        response = self.client.get(f'{self.product_list_url}51/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_virtual_product_list_filter_by_category(self):
+        """Test that category counts add up and every result belongs to the category."""
+        total = 0
+        for category_id in range(1, len(CATEGORIES_DATA) + 1):
+            response = self.client.get(f'{self.product_list_url}?category={category_id}&page_size=100')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['count'], len(response.data['results']))
+            for product_data in response.data['results']:
+                self.assertEqual(product_data['category']['id'], category_id)
+            total += response.data['count']
+        self.assertEqual(total, 50)
+
+        response = self.client.get(self.product_list_url + '?category=99')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_virtual_product_list_ordering(self):
+        """Test ordering the virtual catalog by price and title."""
+        response = self.client.get(self.product_list_url + '?ordering=-price&category=3&page_size=100')
+        prices = [Decimal(p['price']) for p in response.data['results']]
+        self.assertEqual(prices, sorted(prices, reverse=True))
+
+        response = self.client.get(self.product_list_url + '?ordering=title&page_size=100')
+        self.assertEqual(response.data['count'], 50)
+        titles = [p['title'] for p in response.data['results']]
+        self.assertEqual(titles, sorted(titles))
+
+    def test_virtual_product_list_rejects_search(self):
+        """Test that search is rejected instead of returning the unfiltered catalog."""
+        response = self.client.get(self.product_list_url + '?search=shoe')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('search', response.data)
+
+    def test_virtual_product_random(self):
+        """Test that the random endpoint samples the virtual catalog."""
+        response = self.client.get(self.product_list_url + 'random/?count=5&seed=3&category=1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len({p['id'] for p in response.data}), 5)
+        for product_data in response.data:
+            self.assertEqual(product_data['category']['id'], 1)
+
+    def test_virtual_category_list(self):
+        """Test that the virtual categories match populate_products."""
+        response = self.client.get(self.category_list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], len(CATEGORIES_DATA))
+        names = [item['name'] for item in response.data['results']]
+        self.assertEqual(names, [c['name'] for c in CATEGORIES_DATA])
+
+
+@override_settings(CATALOG_STORE=True, CATALOG_STORE_REFRESH_INTERVAL=3600)
+class CatalogStoreAPITestCase(APITransactionTestCase):
+    """
+    Test suite for answering product listings from the in-process catalog store.
+    Refreshes are run explicitly instead of waiting for the background thread.
+    Writes really commit, since the data version is bumped on commit.
+    """
+
+    def setUp(self):
+        self.category1 = Category.objects.create(name='Category 1')
+        self.category2 = Category.objects.create(name='Category 2')
+        self.product1 = Product.objects.create(
+            category=self.category1, title='Banana', description='topic1', price=Decimal('30.00'), sizes='S'
+        )
+        self.product2 = Product.objects.create(
+            category=self.category2, title='Apple', description='topic2', price=Decimal('10.00'), sizes='M'
+        )
+        self.product3 = Product.objects.create(
+            category=self.category1, title='Cherry', description='topic1', price=Decimal('20.00'), sizes='L'
+        )
+        self.product_list_url = '/api/products/'
+        self.store = get_catalog_store()
+        self.store.clear()
+
+    def get_ids(self, query):
+        response = self.client.get(self.product_list_url + query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [p['id'] for p in response.data['results']]
+
+    def test_store_list_ordering_and_filter(self):
+        """Test that orderings and category filters match the database results."""
+        self.assertEqual(self.get_ids('?ordering=price'), [self.product2.id, self.product3.id, self.product1.id])
+        self.assertEqual(self.get_ids('?ordering=-title'), [self.product3.id, self.product1.id, self.product2.id])
+        self.assertEqual(self.get_ids(f'?category={self.category1.id}&ordering=-price'), [self.product1.id, self.product3.id])
+        self.assertEqual(self.get_ids('?page_size=2&page=2'), [self.product3.id])
+
+        response = self.client.get(self.product_list_url + '?category=999')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_store_merges_changes_without_rebuilding(self):
+        """Test that updates, inserts and deletes are merged into the loaded snapshot."""
+        self.get_ids('')
+        snapshot = self.store.get_state().snapshot
+
+        with transaction.atomic():
+            self.product2.price = Decimal('99.00')
+            self.product2.title = 'Blueberry'
+            self.product2.save()
+            self.product3.delete()
+            product4 = Product.objects.create(
+                category=self.category2, title='Date', description='topic2', price=Decimal('5.00'), sizes='XL'
+            )
+            product5 = Product.objects.create(
+                category=self.category1, title='Avocado', description='topic1', price=Decimal('25.00'), sizes='S'
+            )
+
+        # Requests keep being served from the loaded state until a refresh swaps in a new one
+        self.assertEqual(self.get_ids('?ordering=price'), [self.product2.id, self.product1.id])
+        self.assertTrue(self.store.refresh())
+        state = self.store.get_state()
+        self.assertIs(state.snapshot, snapshot)
+        # Rows the snapshot already reflects are not re-applied, although they are within the safety window
+        self.assertEqual(set(state.overlay.rows), {self.product2.id, product4.id, product5.id})
+        # Merged layouts are built by the refresh, not by the requests that follow it
+        self.assertIn(('price', None), state.overlay._layouts)
+        self.assertIn(('title', self.category2.id), state.overlay._layouts)
+
+        self.assertEqual(
+            self.get_ids('?ordering=price'), [product4.id, product5.id, self.product1.id, self.product2.id]
+        )
+        self.assertEqual(
+            self.get_ids('?ordering=title'), [product5.id, self.product1.id, self.product2.id, product4.id]
+        )
+        self.assertEqual(
+            self.get_ids('?ordering=-title&page_size=2&page=2'), [self.product1.id, product5.id]
+        )
+        self.assertEqual(self.get_ids(f'?category={self.category2.id}&ordering=-price'), [self.product2.id, product4.id])
+        self.assertEqual(self.get_ids(f'?category={self.category1.id}'), [self.product1.id, product5.id])
+
+    def test_store_title_order_follows_database_collation(self):
+        """Test that overlay rows following the same snapshot row keep the database's title order."""
+        self.get_ids('')
+        with transaction.atomic():
+            for title in ['apple', 'Apricot', 'banana', 'Avocado', 'cherry', 'Blueberry', 'apple']:
+                Product.objects.create(
+                    category=self.category1, title=title, description='topic1', price=Decimal('5.00'), sizes='S'
+                )
+            self.product3.title = 'avocado'
+            self.product3.save()
+        self.store.refresh()
+
+        expected = list(Product.objects.order_by('title', 'id').values_list('id', flat=True))
+        self.assertEqual(self.get_ids('?ordering=title&page_size=20'), expected)
+        self.assertEqual(self.get_ids('?ordering=-title&page_size=20'), expected[::-1])
+
+    def test_populate_products_rebuilds_store_without_tombstones(self):
+        """Test that replacing the whole catalog skips per-row tombstones and forces a rebuild."""
+        self.get_ids('')
+        snapshot = self.store.get_state().snapshot
+        call_command('populate_products', num_products=5, stdout=io.StringIO())
+
+        self.assertFalse(ProductTombstone.objects.exists())
+        self.assertTrue(self.store.refresh())
+        self.assertIsNot(self.store.get_state().snapshot, snapshot)
+        self.assertEqual(
+            self.get_ids('?ordering=price'), list(Product.objects.order_by('price', 'id').values_list('id', flat=True))
+        )
+
+    def test_store_rereads_safety_window(self):
+        """Test that a change stamped before the last refresh is still picked up."""
+        self.get_ids('')
+        watermark = self.store.get_state().watermark
+        Product.objects.filter(pk=self.product1.pk).update(
+            price=Decimal('1.00'), updated_at=watermark - timedelta(seconds=30)
+        )
+        CatalogVersion.bump()
+        self.store.refresh()
+        self.assertEqual(self.get_ids('?ordering=price'), [self.product1.id, self.product2.id, self.product3.id])
+
+    def test_store_bumps_version_once_per_transaction(self):
+        """Test that a transaction writing many rows bumps the data version once."""
+        version = CatalogVersion.get_current()
+        deleted_id = self.product1.id
+        with transaction.atomic():
+            for i in range(5):
+                Product.objects.create(
+                    category=self.category1, title=f'Bulk {i}', description='D', price=Decimal('1.00'), sizes='S'
+                )
+            self.product1.delete()
+        self.assertEqual(CatalogVersion.get_current(), version + 1)
+        self.assertTrue(ProductTombstone.objects.filter(product_id=deleted_id).exists())
+
+    @override_settings(CATALOG_STORE=False)
+    def test_writes_bump_version_without_store(self):
+        """Test that writers record changes even when they do not run the store themselves."""
+        version = CatalogVersion.get_current()
+        product_id = self.product1.id
+        with transaction.atomic():
+            self.product1.delete()
+        self.assertEqual(CatalogVersion.get_current(), version + 1)
+        self.assertTrue(ProductTombstone.objects.filter(product_id=product_id).exists())
+
+    def test_store_skips_database_sorting(self):
+        """Test that a listing only reads the page rows once the store is loaded."""
+        self.get_ids('')
+        with self.assertNumQueries(1):
+            self.get_ids(f'?category={self.category1.id}&ordering=price')
+
+    def test_store_falls_back_to_database_for_search(self):
+        """Test that searches are still answered by the database."""
+        response = self.client.get(self.product_list_url + '?search=topic2')
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['id'], self.product2.id)
+
+    def test_store_memory_footprint(self):
+        """Test that the store reports the bytes held by its columns."""
+        self.get_ids('')
+        self.assertGreater(get_catalog_store().memory_footprint(), 0)
+
+
+class BulkImportAPITestCase(APITestCase):
+    """
+    Test suite for the bulk product import endpoint and management command.
+    """
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.category = Category.objects.create(name='Clothing')
+        self.existing = Product.objects.create(
+            external_id='SKU-1', category=self.category, title='Old title',
+            description='Old description', price=Decimal('10.00'), sizes='S'
+        )
+        self.import_url = '/api/products/import/'
+
+    def post_import(self, body, content_type):
+        self.client.force_authenticate(self.admin)
+        return self.client.generic('POST', self.import_url, body, content_type=content_type)
+
+    def test_import_csv_upserts_by_external_id(self):
+        """Test that CSV rows update existing products and create new ones and categories."""
+        body = (
+            'external_id,title,description,price,image,category,sizes\n'
+            'SKU-1,New title,New description,12.50,,Clothing,"S,M"\n'
+            'SKU-2,Lamp,A lamp,30.00,https://example.com/lamp.jpg,Home & Kitchen,One Size\n'
+        )
+        response = self.post_import(body, 'text/csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'imported': 2, 'rejected': 0, 'skipped': 0, 'completed': True, 'errors': []})
+
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.title, 'New title')
+        self.assertEqual(self.existing.price, Decimal('12.50'))
+        self.assertEqual(self.existing.sizes, 'S,M')
+        lamp = Product.objects.get(external_id='SKU-2')
+        self.assertEqual(lamp.category.name, 'Home & Kitchen')
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_import_ndjson_reports_invalid_rows(self):
+        """Test that invalid NDJSON rows are rejected without aborting the import."""
+        body = (
+            '{"external_id": "SKU-3", "title": "Shoe", "description": "A shoe", "price": 40, "category": "Footwear", "sizes": ["40", "42"]}\n'
+            '{"external_id": "SKU-4", "title": "Bad", "description": "Bad price", "price": "abc", "category": "Footwear", "sizes": "M"}\n'
+            'not json\n'
+        )
+        response = self.post_import(body, 'application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['imported'], 1)
+        self.assertEqual(response.data['rejected'], 2)
+        self.assertEqual([error['line'] for error in response.data['errors']], [2, 3])
+        self.assertEqual(Product.objects.get(external_id='SKU-3').sizes, '40,42')
+        self.assertFalse(Product.objects.filter(external_id='SKU-4').exists())
+
+    def test_import_counts_superseded_rows(self):
+        """Test that a row replaced by a later one with the same external_id is counted as skipped."""
+        body = (
+            'external_id,title,description,price,category,sizes\n'
+            'SKU-9,First,D,1.00,Books,M\n'
+            'SKU-9,Second,D,2.00,Books,M\n'
+        )
+        response = self.post_import(body, 'text/csv')
+        self.assertEqual((response.data['imported'], response.data['skipped']), (1, 1))
+        self.assertEqual(Product.objects.get(external_id='SKU-9').title, 'Second')
+
+    def test_import_reports_partial_summary_on_unreadable_input(self):
+        """Test that input that cannot be decoded stops the import but reports the rows already written."""
+        version = CatalogVersion.get_current()
+        body = ''.join(
+            f'{{"external_id": "R-{i}", "title": "T", "description": "D", "price": 1, "category": "Books", "sizes": "M"}}\n'
+            for i in range(3)
+        ).encode() + b'\xff\xfe\n'
+        self.client.force_authenticate(self.admin)
+        response = self.client.generic('POST', self.import_url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['imported'], 3)
+        self.assertFalse(response.data['completed'])
+        self.assertIn('after line 3', response.data['errors'][-1]['error'])
+        self.assertEqual(Product.objects.filter(external_id__startswith='R-').count(), 3)
+        self.assertEqual(CatalogVersion.get_current(), version + 1)
+
+    def test_import_bumps_catalog_version_once(self):
+        """Test that an import bumps the data version once, not once per row."""
+        version = CatalogVersion.get_current()
+        body = '\n'.join(
+            f'{{"external_id": "B-{i}", "title": "T", "description": "D", "price": 1, "category": "Books", "sizes": "M"}}'
+            for i in range(10)
+        )
+        self.post_import(body, 'application/x-ndjson')
+        self.assertEqual(CatalogVersion.get_current(), version + 1)
+
+    def test_import_multipart_upload(self):
+        """Test that a feed can be uploaded as a multipart file."""
+        feed = io.BytesIO(b'{"external_id": "U-1", "title": "T", "description": "D", "price": "5.00", "category": "Books", "sizes": "M"}\n')
+        feed.name = 'feed.ndjson'
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(self.import_url, {'file': feed}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['imported'], 1)
+
+    def test_import_multipart_requires_file(self):
+        """Test that a multipart request without a `file` part is rejected."""
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(f'{self.import_url}?input_format=csv', {'feed': 'x'}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('file', response.data)
+
+    def test_import_rejects_nul_characters(self):
+        """Test that rows containing NUL characters are rejected."""
+        body = '{"external_id": "N-1", "title": "Bad\\u0000title", "description": "D", "price": 1, "category": "Books", "sizes": "M"}\n'
+        response = self.post_import(body, 'application/x-ndjson')
+        self.assertEqual(response.data['rejected'], 1)
+        self.assertIn('NUL', response.data['errors'][0]['error'])
+        self.assertFalse(Product.objects.filter(external_id='N-1').exists())
+
+    def test_import_skips_batch_rejected_by_database(self):
+        """Test that a batch the database rejects is reported by line range and later batches still import."""
+        method = '_upsert_postgresql' if connection.vendor == 'postgresql' else '_upsert_generic'
+        upsert = getattr(ProductImporter, method)
+
+        def failing_upsert(importer, rows):
+            upsert(importer, rows)
+            if any(row['external_id'] == 'D-2' for row in rows):
+                with importer.connection.cursor() as cursor:
+                    cursor.execute('SELECT * FROM missing_table')
+
+        feed = io.BytesIO(''.join(
+            f'{{"external_id": "D-{i}", "title": "T", "description": "D", "price": 1, "category": "Books", "sizes": "M"}}\n'
+            for i in range(6)
+        ).encode())
+        with mock.patch.object(ProductImporter, method, autospec=True, side_effect=failing_upsert):
+            summary = ProductImporter(batch_size=2).run(read_rows(feed, 'ndjson'))
+
+        self.assertEqual(summary['imported'], 4)
+        self.assertEqual(summary['rejected'], 2)
+        self.assertEqual(summary['errors'][0]['lines'], [3, 4])
+        self.assertEqual(
+            sorted(Product.objects.filter(external_id__startswith='D-').values_list('external_id', flat=True)),
+            ['D-0', 'D-1', 'D-4', 'D-5'],
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'Exercises the COPY and ON CONFLICT path')
+    def test_import_postgresql_upsert(self):
+        """Test the PostgreSQL staging-table upsert across several batches."""
+        feed = io.BytesIO(
+            b'external_id,title,description,price,image,category,sizes\n'
+            b'SKU-1,New title,New description,12.50,,Clothing,"S,M"\n'
+            b'P-1,Lamp,A lamp,30.00,https://example.com/lamp.jpg,Home & Kitchen,One Size\n'
+            b'P-2,"Desk, oak","Says ""sturdy""",99.99,,Home & Kitchen,One Size\n'
+            b'P-3,Novel,A novel,7.00,,Books,M\n'
+            b'P-1,Lamp v2,A lamp,31.00,,Home & Kitchen,One Size\n'
+        )
+        summary = ProductImporter(batch_size=2).run(read_rows(feed, 'csv'))
+        self.assertEqual(summary, {'imported': 5, 'rejected': 0, 'skipped': 0, 'completed': True, 'errors': []})
+
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.title, 'New title')
+        self.assertEqual(self.existing.price, Decimal('12.50'))
+        self.assertEqual(self.existing.sizes, 'S,M')
+        lamp = Product.objects.get(external_id='P-1')
+        self.assertEqual(lamp.title, 'Lamp v2')
+        self.assertIsNone(lamp.image)
+        desk = Product.objects.get(external_id='P-2')
+        self.assertEqual(desk.title, 'Desk, oak')
+        self.assertEqual(desk.description, 'Says "sturdy"')
+        self.assertEqual(desk.category.name, 'Home & Kitchen')
+        self.assertEqual(Product.objects.get(external_id='P-3').category.name, 'Books')
+        self.assertEqual(Category.objects.filter(name='Home & Kitchen').count(), 1)
+        self.assertEqual(Product.objects.count(), 4)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('pg_temp.products_product_import')")
+            self.assertIsNone(cursor.fetchone()[0])
+
+    def test_import_requires_admin(self):
+        """Test that anonymous users cannot import products."""
+        response = self.client.generic('POST', self.import_url, 'external_id\n', content_type='text/csv')
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+    def test_import_unknown_format(self):
+        """Test that unsupported content types are rejected."""
+        response = self.post_import('<xml/>', 'application/xml')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_products_command(self):
+        """Test that the management command imports a file in small batches."""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as feed:
+            feed.write('external_id,title,description,price,category,sizes\n')
+            for i in range(5):
+                feed.write(f'C-{i},Title {i},Description,{i}.99,Books,M\n')
+            feed.flush()
+            call_command('import_products', feed.name, batch_size=2, stdout=io.StringIO())
+        self.assertEqual(Product.objects.filter(external_id__startswith='C-').count(), 5)
+
+    def test_import_products_command_stops_on_unreadable_input(self):
+        """Test that the command reports what was imported before failing on undecodable input."""
+        with tempfile.NamedTemporaryFile('wb', suffix='.csv') as feed:
+            feed.write(b'external_id,title,description,price,category,sizes\nC-1,Title,Description,1.00,Books,M\n\xff\n')
+            feed.flush()
+            stdout = io.StringIO()
+            with self.assertRaises(CommandError):
+                call_command('import_products', feed.name, stdout=stdout)
+        self.assertIn('Imported 1 products', stdout.getvalue())
+        self.assertTrue(Product.objects.filter(external_id='C-1').exists())
@@ -1,11 +1,25 @@
-from rest_framework import viewsets, generics
+from django.conf import settings
+from django.http import Http404
+from rest_framework import viewsets, generics, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
 from rest_framework import filters
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.throttling import AnonRateThrottle 
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 
 from products.models import Product, Category
 from products.serializers import ProductSerializer, CategorySerializer
+from products.product_lists import LazyProductList
+from products.sampling import sample_random_products
+from products.virtual_catalog import VirtualProductList, get_virtual_catalog
+from products.catalog_store import get_catalog_store
+from products.bulk_import import INPUT_FORMATS, import_products
 
 class CustomPagination(PageNumberPagination):
     """
@@ -29,6 +43,111 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     ordering_fields = ['price', 'title']
     throttle_classes = [AnonRateThrottle] 
 
+    def get_queryset(self):
+        if settings.VIRTUAL_CATALOG:
+            return get_virtual_catalog().products()
+        return super().get_queryset()
+
+    def filter_queryset(self, queryset):
+        if isinstance(queryset, VirtualProductList):
+            return queryset.filter_from_params(self.request.query_params, self.ordering_fields)
+        if settings.CATALOG_STORE and self.action in ('list', 'random'):
+            products = get_catalog_store().products(queryset, self.request.query_params, self.ordering_fields)
+            if products is not None:
+                return products
+        return super().filter_queryset(queryset)
+
+    def get_object(self):
+        if settings.VIRTUAL_CATALOG:
+            product = get_virtual_catalog().get_product(self.kwargs[self.lookup_field])
+            if product is None:
+                raise Http404
+            self.check_object_permissions(self.request, product)
+            return product
+        return super().get_object()
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter('count', int, description='Number of random products to return (default 10, max 100).'),
+            OpenApiParameter('seed', int, description='Optional seed for repeatable results.'),
+        ],
+        responses=ProductSerializer(many=True),
+    )
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def random(self, request):
+        """
+        Returns N random products, optionally within a category (`?category=`).
+        Uses random id probing so the cost does not grow with the table size.
+        """
+        count = self._get_int_param(request, 'count', default=10)
+        seed = self._get_int_param(request, 'seed')
+        if count < 1:
+            raise ValidationError({'count': 'Must be a positive integer.'})
+        count = min(count, CustomPagination.max_page_size)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if isinstance(queryset, LazyProductList):
+            products = queryset.sample(count, seed=seed)
+        else:
+            products = sample_random_products(queryset, count, seed=seed)
+        serializer = self.get_serializer(products, many=True)
+        return Response(serializer.data)
+
+    @extend_schema(
+        request={
+            'text/csv': OpenApiTypes.BINARY,
+            'application/x-ndjson': OpenApiTypes.BINARY,
+            'multipart/form-data': {'type': 'object', 'properties': {'file': {'type': 'string', 'format': 'binary'}}},
+        },
+        responses=OpenApiTypes.OBJECT,
+    )
+    @action(
+        detail=False, methods=['post'], url_path='import',
+        permission_classes=[IsAdminUser], parser_classes=[MultiPartParser],
+    )
+    def bulk_import(self, request):
+        """
+        Upserts products by `external_id` from a CSV or NDJSON body (or a
+        multipart `file` upload). Admin only. Rows are streamed in batches and
+        invalid rows are reported without aborting the import.
+        """
+        upload = None
+        if request.content_type.startswith('multipart/'):
+            # The parser has consumed the body, so there is nothing else to read
+            upload = request.FILES.get('file')
+            if upload is None:
+                raise ValidationError({'file': 'This field is required.'})
+        input_format = self._get_input_format(request, upload)
+        stream = upload if upload is not None else request.stream
+        if stream is None:
+            raise ValidationError({'detail': 'The request body is empty.'})
+        summary = import_products(stream, input_format)
+        # Batches read before an unreadable part of the input stay committed, and the summary says so
+        return Response(summary, status=status.HTTP_200_OK if summary['completed'] else status.HTTP_400_BAD_REQUEST)
+
+    @staticmethod
+    def _get_input_format(request, upload):
+        input_format = request.query_params.get('input_format')
+        if not input_format:
+            if upload is not None:
+                input_format = upload.name.rsplit('.', 1)[-1].lower()
+            else:
+                input_format = request.content_type.split(';')[0].strip().split('/')[-1]
+            input_format = {'x-ndjson': 'ndjson', 'jsonl': 'ndjson'}.get(input_format, input_format)
+        if input_format not in INPUT_FORMATS:
+            raise ValidationError({'input_format': f'Must be one of: {", ".join(INPUT_FORMATS)}.'})
+        return input_format
+
+    @staticmethod
+    def _get_int_param(request, name, default=None):
+        value = request.query_params.get(name)
+        if value is None or value == '':
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({name: 'Must be an integer.'})
+
 
 #View for listing Categories as a separate endpoint
 class CategoryListView(generics.ListAPIView):
@@ -37,4 +156,9 @@ class CategoryListView(generics.ListAPIView):
     """
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
-    throttle_classes = [AnonRateThrottle] 
\ No newline at end of file
+    throttle_classes = [AnonRateThrottle] 
+
+    def get_queryset(self):
+        if settings.VIRTUAL_CATALOG:
+            return get_virtual_catalog().categories
+        return super().get_queryset()
\ No newline at end of file
@@ -0,0 +1,235 @@
+import random
+import threading
+from array import array
+from decimal import Decimal
+
+from django.conf import settings
+from faker import Faker
+from faker.providers.company.en_US import Provider as CompanyProvider
+from rest_framework.exceptions import ValidationError
+
+from products.catalog_data import (
+    CATEGORIES_DATA, CLOUDINARY_IMAGE_URLS, DEFAULT_PLACEHOLDER, SIZES, PRICE_MIN, PRICE_MAX,
+)
+from products.models import Category, Product
+from products.product_lists import INVALID_CATEGORY_MESSAGE, LazyProductList
+
+_MASK64 = (1 << 64) - 1
+
+# Salts so each generated field draws from an independent hash stream
+_SALT_BLOCK = 1
+_SALT_PRICE = 2
+_SALT_TITLE = 3
+_SALT_IMAGE = 4
+_SALT_DETAILS = 5
+
+# Same word lists Faker's catch_phrase() uses, sorted so a title's rank is its sort key
+_TITLE_WORDS = [sorted(words) for words in CompanyProvider.catch_phrase_words]
+_TITLE_COMBINATIONS = len(_TITLE_WORDS[0]) * len(_TITLE_WORDS[1]) * len(_TITLE_WORDS[2])
+
+_PRICE_MIN_CENTS = int(PRICE_MIN * 100)
+_PRICE_SPAN_CENTS = int(PRICE_MAX * 100) - _PRICE_MIN_CENTS + 1
+
+
+def _mix(seed, value, salt):
+    """SplitMix64 finaliser over (seed, value, salt); cheap and well distributed."""
+    z = (seed * 0x9E3779B97F4A7C15 + value * 0xBF58476D1CE4E5B9 + salt * 0x94D049BB133111EB) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+_local = threading.local()
+
+
+def _get_faker():
+    # Faker instances are expensive to build and not thread-safe once seeded
+    fake = getattr(_local, 'fake', None)
+    if fake is None:
+        fake = _local.fake = Faker()
+    return fake
+
+
+class VirtualCatalog:
+    """
+    A product catalog computed deterministically from (seed, id) instead of
+    being stored in the database.
+
+    Ids run from 1 to `size`. Ids are grouped in blocks of one product per
+    category, with a seeded shuffle inside each block, so category counts and
+    the n-th product of a category are pure arithmetic. Orderings by price or
+    title use compact sorted id arrays built lazily on first use.
+    """
+
+    def __init__(self, size, seed):
+        self.size = size
+        self.seed = seed
+        self.categories = [
+            Category(id=index + 1, **data) for index, data in enumerate(CATEGORIES_DATA)
+        ]
+        self._sorted_ids = {}
+        self._category_column = None
+        self._lock = threading.RLock()
+
+    # --- Arithmetic layout ---
+
+    def _block_permutation(self, block):
+        """Category index assigned to each offset of an id block."""
+        permutation = list(range(len(self.categories)))
+        random.Random(_mix(self.seed, block, _SALT_BLOCK)).shuffle(permutation)
+        return permutation
+
+    def category_index(self, product_id):
+        block, offset = divmod(product_id - 1, len(self.categories))
+        return self._block_permutation(block)[offset]
+
+    def category_count(self, category_index):
+        full_blocks, remainder = divmod(self.size, len(self.categories))
+        if remainder and self._block_permutation(full_blocks).index(category_index) < remainder:
+            return full_blocks + 1
+        return full_blocks
+
+    def nth_in_category(self, category_index, position):
+        """Id of the product at `position` (0-based) within a category, in id order."""
+        offset = self._block_permutation(position).index(category_index)
+        return position * len(self.categories) + offset + 1
+
+    # --- Generated fields ---
+
+    def price_cents(self, product_id):
+        return _PRICE_MIN_CENTS + _mix(self.seed, product_id, _SALT_PRICE) % _PRICE_SPAN_CENTS
+
+    def title_rank(self, product_id):
+        return _mix(self.seed, product_id, _SALT_TITLE) % _TITLE_COMBINATIONS
+
+    def title(self, product_id):
+        rank = self.title_rank(product_id)
+        rank, third = divmod(rank, len(_TITLE_WORDS[2]))
+        first, second = divmod(rank, len(_TITLE_WORDS[1]))
+        return ' '.join((_TITLE_WORDS[0][first], _TITLE_WORDS[1][second], _TITLE_WORDS[2][third]))
+
+    def get_product(self, product_id):
+        """Returns the unsaved Product for `product_id`, or None if it is out of range."""
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            return None
+        if not 1 <= product_id <= self.size:
+            return None
+
+        category = self.categories[self.category_index(product_id)]
+        images = CLOUDINARY_IMAGE_URLS.get(category.name, [DEFAULT_PLACEHOLDER])
+        details = random.Random(_mix(self.seed, product_id, _SALT_DETAILS))
+        fake = _get_faker()
+        fake.seed_instance(details.getrandbits(64))
+
+        return Product(
+            id=product_id,
+            category=category,
+            title=self.title(product_id),
+            description=fake.paragraph(nb_sentences=5),
+            price=Decimal(self.price_cents(product_id)).scaleb(-2),
+            sizes=','.join(details.sample(SIZES, k=details.randint(1, 4))),
+            image=images[_mix(self.seed, product_id, _SALT_IMAGE) % len(images)],
+        )
+
+    # --- Precomputed indexes ---
+
+    def _get_category_column(self):
+        if self._category_column is None:
+            column = array('B')
+            for block in range((self.size + len(self.categories) - 1) // len(self.categories)):
+                column.extend(self._block_permutation(block))
+            del column[self.size:]
+            self._category_column = column
+        return self._category_column
+
+    def sorted_ids(self, field, category_index=None):
+        """Ids ordered by `field` ('price' or 'title'), ties broken by id."""
+        key = (field, category_index)
+        ids = self._sorted_ids.get(key)
+        if ids is not None:
+            return ids
+        with self._lock:
+            if key not in self._sorted_ids:
+                if category_index is None:
+                    sort_key = self.price_cents if field == 'price' else self.title_rank
+                    ids = array('L', sorted(range(1, self.size + 1), key=sort_key))
+                else:
+                    column = self._get_category_column()
+                    ids = array('L', (
+                        product_id for product_id in self.sorted_ids(field)
+                        if column[product_id - 1] == category_index
+                    ))
+                self._sorted_ids[key] = ids
+        return self._sorted_ids[key]
+
+    def products(self, category_index=None, ordering=None):
+        return VirtualProductList(self, category_index, ordering)
+
+
+class VirtualProductList(LazyProductList):
+    """Virtual products in id, price or title order, optionally within one category."""
+
+    def __init__(self, catalog, category_index=None, ordering=None):
+        self.catalog = catalog
+        self.category_index = category_index
+        self.ordering = ordering
+
+    def __len__(self):
+        if self.category_index is None:
+            return self.catalog.size
+        return self.catalog.category_count(self.category_index)
+
+    def _id_at(self, position):
+        if self.ordering:
+            field = self.ordering.lstrip('-')
+            ids = self.catalog.sorted_ids(field, self.category_index)
+            return ids[-position - 1] if self.ordering.startswith('-') else ids[position]
+        if self.category_index is None:
+            return position + 1
+        return self.catalog.nth_in_category(self.category_index, position)
+
+    def _fetch(self, ids):
+        return [self.catalog.get_product(product_id) for product_id in ids]
+
+    def filter_from_params(self, query_params, ordering_fields):
+        """
+        Applies the `category` and `ordering` query parameters the same way the
+        queryset filter backends do. Only the first valid ordering term is used.
+        Search is rejected rather than ignored, since generated products cannot
+        be searched without generating the whole catalog.
+        """
+        if query_params.get('search'):
+            raise ValidationError({'search': ['Search is not supported in virtual catalog mode.']})
+
+        category_index = self.category_index
+        category = query_params.get('category')
+        if category:
+            try:
+                category_index = int(category) - 1
+            except ValueError:
+                category_index = -1
+            if not 0 <= category_index < len(self.catalog.categories):
+                raise ValidationError({'category': [INVALID_CATEGORY_MESSAGE]})
+
+        ordering = self.ordering
+        for term in query_params.get('ordering', '').split(','):
+            term = term.strip()
+            if term.lstrip('-') in ordering_fields:
+                ordering = term
+                break
+
+        return VirtualProductList(self.catalog, category_index, ordering)
+
+
+_catalogs = {}
+
+
+def get_virtual_catalog():
+    """Returns the process-wide catalog for the configured size and seed."""
+    key = (settings.VIRTUAL_CATALOG_SIZE, settings.VIRTUAL_CATALOG_SEED)
+    catalog = _catalogs.get(key)
+    if catalog is None:
+        catalog = _catalogs.setdefault(key, VirtualCatalog(*key))
+    return catalog